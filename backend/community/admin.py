@@ -1,6 +1,7 @@
 # community/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models.functions import Substr
 from .models import User, Post, Comment, Like
 
 
@@ -16,9 +17,10 @@ class UserAdmin(BaseUserAdmin):
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ['id', 'author', 'content_preview', 'created_at', 'like_count']
+    list_select_related = ['author']
     list_filter = ['created_at']
     search_fields = ['content', 'author__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['like_count', 'created_at', 'updated_at']
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -28,12 +30,22 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['id', 'author', 'post', 'parent', 'content_preview', 'created_at']
+    # post/parent render via __str__, which shows their author
+    list_select_related = ['author', 'post__author', 'parent__author']
     list_filter = ['created_at']
     search_fields = ['content', 'author__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['like_count', 'created_at', 'updated_at']
+    
+    def get_queryset(self, request):
+        # Truncate in SQL so list rows never load the full comment body;
+        # one extra character tells whether the '...' suffix is needed
+        return super().get_queryset(request).annotate(
+            content_head=Substr('content', 1, 51)
+        ).defer('content')
     
     def content_preview(self, obj):
-        return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
+        head = obj.content_head
+        return head[:50] + '...' if len(head) > 50 else head
     content_preview.short_description = 'Content'
 
 
@@ -42,11 +54,19 @@ class LikeAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'target', 'created_at']
     list_filter = ['created_at']
     readonly_fields = ['created_at']
+    # target only needs the FK ids already on Like, so just the user is joined
+    list_select_related = ['user']
+
+    def get_queryset(self, request):
+        # Only the columns the changelist renders
+        return super().get_queryset(request).only(
+            'id', 'user__username', 'post_id', 'comment_id', 'created_at'
+        )
     
     def target(self, obj):
-        if obj.post:
-            return f"Post #{obj.post.id}"
-        elif obj.comment:
-            return f"Comment #{obj.comment.id}"
+        if obj.post_id:
+            return f"Post #{obj.post_id}"
+        elif obj.comment_id:
+            return f"Comment #{obj.comment_id}"
         return "Unknown"
     target.short_description = 'Target'
@@ -0,0 +1,61 @@
+# community/management/commands/expire_karma.py
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+
+from community.models import (
+    Like, UserKarma, KarmaWatermark, POST_LIKE_KARMA, COMMENT_LIKE_KARMA,
+    LEADERBOARD_CACHE_KEY, karma_window_start
+)
+
+
+class Command(BaseCommand):
+    """
+    Age likes that fell out of the 24h window out of UserKarma.
+    Meant to run every minute (cron / scheduled job); each run only scans
+    the likes created between the previous run's cutoff and the new one.
+    """
+    help = 'Subtract karma for likes older than the 24h window'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # FOR UPDATE waits for in-flight unlikes (they read the watermark
+            # FOR SHARE), so no like is subtracted both here and by its unlike
+            watermark, _ = KarmaWatermark.objects.select_for_update().get_or_create(pk=1)
+            prev_cutoff, new_cutoff = watermark.cutoff, karma_window_start()
+            if new_cutoff <= prev_cutoff:
+                return
+
+            # One flat GROUP BY over the likes that left the window since the
+            # previous run, keyed by the liked post/comment's author
+            expired = list(Like.objects.filter(
+                created_at__gt=prev_cutoff, created_at__lte=new_cutoff
+            ).annotate(
+                author_id=Coalesce('post__author_id', 'comment__author_id')
+            ).values('author_id').annotate(
+                post_likes=Count('id', filter=Q(post__isnull=False)),
+                comment_likes=Count('id', filter=Q(comment__isnull=False))
+            ).values_list('author_id', 'post_likes', 'comment_likes'))
+
+            for author_id, post_likes, comment_likes in expired:
+                UserKarma.objects.filter(user_id=author_id).update(
+                    post_karma_24h=F('post_karma_24h') - post_likes * POST_LIKE_KARMA,
+                    comment_karma_24h=F('comment_karma_24h') - comment_likes * COMMENT_LIKE_KARMA
+                )
+
+            watermark.cutoff = new_cutoff
+            watermark.save(update_fields=['cutoff'])
+            # Authors left with nothing in the window don't need a row
+            deleted, _ = UserKarma.objects.filter(
+                user_id__in=[author_id for author_id, _, _ in expired],
+                post_karma_24h__lte=0, comment_karma_24h__lte=0
+            ).delete()
+
+        if expired:
+            cache.delete(LEADERBOARD_CACHE_KEY)
+
+        self.stdout.write(
+            f"Expired karma for {len(expired)} users, removed {deleted} empty rows"
+        )
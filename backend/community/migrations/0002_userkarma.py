@@ -0,0 +1,53 @@
+# Generated by Django 5.2.11 on 2026-10-14 17:31
+
+import community.models
+import django.db.models.deletion
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_user_karma(apps, schema_editor):
+    """Seed counters from likes already inside the 24h window"""
+    from collections import defaultdict
+    from django.db.models import Count
+
+    Like = apps.get_model('community', 'Like')
+    UserKarma = apps.get_model('community', 'UserKarma')
+
+    cutoff = community.models.karma_window_start()
+    recent = Like.objects.filter(created_at__gt=cutoff)
+    karma = defaultdict(lambda: [0, 0])
+    for author_id, n in recent.filter(post__isnull=False).values_list('post__author_id').annotate(n=Count('id')):
+        karma[author_id][0] = n * community.models.POST_LIKE_KARMA
+    for author_id, n in recent.filter(comment__isnull=False).values_list('comment__author_id').annotate(n=Count('id')):
+        karma[author_id][1] = n * community.models.COMMENT_LIKE_KARMA
+
+    UserKarma.objects.bulk_create([
+        UserKarma(user_id=author_id, post_karma_24h=post_karma, comment_karma_24h=comment_karma, window_start=cutoff)
+        for author_id, (post_karma, comment_karma) in karma.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserKarma',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='karma', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_karma_24h', models.IntegerField(default=0)),
+                ('comment_karma_24h', models.IntegerField(default=0)),
+                ('karma_24h', models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('post_karma_24h'), '+', models.F('comment_karma_24h')), output_field=models.IntegerField())),
+                ('window_start', models.DateTimeField(default=community.models.karma_window_start)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-karma_24h'], name='community_u_karma_2_54ce14_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_user_karma, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-14 17:36
+
+from django.db import migrations, models
+
+
+def backfill_like_counts(apps, schema_editor):
+    """Populate the cached counters from existing Like rows"""
+    from django.db.models import Count, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+
+    Like = apps.get_model('community', 'Like')
+    for model_name, target in (('Post', 'post'), ('Comment', 'comment')):
+        model = apps.get_model('community', model_name)
+        counts = Like.objects.filter(**{target: OuterRef('pk')}).values(target).annotate(
+            count=Count('id')
+        ).values('count')
+        model.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_userkarma'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
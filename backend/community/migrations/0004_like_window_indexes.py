@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-14 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0003_like_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='like',
+            name='community_l_created_786f0e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userkarma',
+            name='community_u_karma_2_54ce14_idx',
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created_at', 'post'], name='like_created_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created_at', 'comment'], name='like_created_comment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userkarma',
+            index=models.Index(condition=models.Q(('karma_24h__gt', 0)), fields=['-karma_24h'], name='karma_leaderboard_idx'),
+        ),
+    ]
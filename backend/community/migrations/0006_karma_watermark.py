@@ -0,0 +1,54 @@
+# Generated by Django 5.2.11 on 2026-10-14 18:10
+
+import community.models
+from django.db import migrations, models
+
+
+def rebuild_user_karma(apps, schema_editor):
+    """
+    Per-row window_start values differ, so recount every counter from the
+    likes inside the current window and start the watermark at its cutoff
+    """
+    from collections import defaultdict
+    from django.db.models import Count
+
+    Like = apps.get_model('community', 'Like')
+    UserKarma = apps.get_model('community', 'UserKarma')
+    KarmaWatermark = apps.get_model('community', 'KarmaWatermark')
+
+    cutoff = community.models.karma_window_start()
+    recent = Like.objects.filter(created_at__gt=cutoff)
+    karma = defaultdict(lambda: [0, 0])
+    for author_id, n in recent.filter(post__isnull=False).values_list('post__author_id').annotate(n=Count('id')):
+        karma[author_id][0] = n * community.models.POST_LIKE_KARMA
+    for author_id, n in recent.filter(comment__isnull=False).values_list('comment__author_id').annotate(n=Count('id')):
+        karma[author_id][1] = n * community.models.COMMENT_LIKE_KARMA
+
+    UserKarma.objects.all().delete()
+    UserKarma.objects.bulk_create([
+        UserKarma(user_id=author_id, post_karma_24h=post_karma, comment_karma_24h=comment_karma)
+        for author_id, (post_karma, comment_karma) in karma.items()
+    ])
+    KarmaWatermark.objects.create(pk=1, cutoff=cutoff)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0005_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KarmaWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField(default=community.models.karma_window_start)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='userkarma',
+            name='window_start',
+        ),
+        migrations.RunPython(rebuild_user_karma, migrations.RunPython.noop),
+    ]
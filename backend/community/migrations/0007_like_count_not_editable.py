@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-14 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0006_karma_watermark'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,14 +1,31 @@
 # community/models.py
-from django.db import models
+from django.db import models, transaction, IntegrityError, connections
+from django.db.models import F
+from django.db.models.signals import post_save
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
 
 
+# Karma rules
+POST_LIKE_KARMA = 5
+COMMENT_LIKE_KARMA = 1
+KARMA_WINDOW = timedelta(hours=24)
+
+# Leaderboard response cache; cleared whenever karma counters change
+LEADERBOARD_CACHE_KEY = 'leaderboard:top5'
+LEADERBOARD_CACHE_TIMEOUT = 30
+
+
+def karma_window_start():
+    """Oldest like timestamp that still counts towards karma"""
+    return timezone.now() - KARMA_WINDOW
+
+
 class User(AbstractUser):
     """
     Extended user model.
-    Karma is NOT stored here - it's calculated dynamically from Like records.
+    Karma is NOT stored here - see UserKarma for the denormalized 24h counters.
     """
     bio = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -17,35 +34,92 @@ class User(AbstractUser):
         return self.username
 
 
-class Post(models.Model):
+class LikeCountMixin:
+    """
+    Leaves like_count out of saves of existing rows.
+    The counter only moves through F() updates (see signals.py); writing back
+    a stale loaded value would drop likes that landed since the load.
+    """
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.attname != 'like_count'
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class Post(LikeCountMixin, models.Model):
     """
     A post in the community feed.
-    Like count is derived from Like model, not stored redundantly.
+    like_count is a cached counter kept in sync with Like rows (see signals.py).
     """
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
+    like_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['-created_at']),
+            # Matches FeedCursorPagination's ordering
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
         ]
 
     def __str__(self):
         return f"Post by {self.author.username}: {self.content[:50]}"
 
-    @property
-    def like_count(self):
-        """Dynamically calculate like count"""
-        return self.post_likes.count()
 
+class CommentManager(models.Manager):
+    # Fields the comment tree serializer reads
+    THREAD_FIELDS = ('id', 'post', 'author', 'parent', 'content', 'like_count', 'created_at')
+
+    def thread(self, post_id):
+        """
+        All comments on a post, with authors, ordered so that every
+        parent comes before its replies.
+        
+        On PostgreSQL one recursive CTE walks the tree and returns it in
+        depth-first order (siblings by id). Other backends fall back to
+        created_at order, which also lists parents first.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return list(
+                self.filter(post_id=post_id).select_related('author').only(
+                    *self.THREAD_FIELDS, 'author__id', 'author__username'
+                ).order_by('created_at')
+            )
+        
+        qn = connections[self.db].ops.quote_name
+        table = qn(self.model._meta.db_table)
+        columns = ', '.join(
+            f'c.{qn(self.model._meta.get_field(name).column)}' for name in self.THREAD_FIELDS
+        )
+        authors = models.Prefetch('author', queryset=User.objects.only('id', 'username'))
+        return list(self.raw(f"""
+            WITH RECURSIVE tree AS (
+                SELECT {columns}, ARRAY[c.id] AS path
+                FROM {table} c
+                WHERE c.post_id = %s AND c.parent_id IS NULL
+                UNION ALL
+                SELECT {columns}, t.path || c.id
+                FROM {table} c
+                JOIN tree t ON c.parent_id = t.id
+            )
+            SELECT * FROM tree ORDER BY path
+        """, [post_id]).prefetch_related(authors))
 
-class Comment(models.Model):
+
+class Comment(LikeCountMixin, models.Model):
     """
     Threaded comments with unlimited nesting depth.
     Self-referencing FK for parent-child relationship.
+    like_count is a cached counter kept in sync with Like rows (see signals.py).
     """
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -57,9 +131,12 @@ class Comment(models.Model):
         related_name='replies'
     )
     content = models.TextField()
+    like_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentManager()
+
     class Meta:
         ordering = ['created_at']
         indexes = [
@@ -68,12 +145,49 @@ class Comment(models.Model):
         ]
 
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.id}"
+        return f"Comment by {self.author.username} on {self.post_id}"
+
 
-    @property
-    def like_count(self):
-        """Dynamically calculate like count"""
-        return self.comment_likes.count()
+class LikeManager(models.Manager):
+    def create_unless_exists(self, **fields):
+        """
+        Insert a like unless the user already likes the target, as one
+        INSERT ... ON CONFLICT DO NOTHING RETURNING id statement.
+        Returns the new Like, or None if it already existed.
+        
+        save() is bypassed, so post_save is sent here to keep its
+        receivers (UserKarma counters) in sync.
+        """
+        like = self.model(created_at=timezone.now(), **fields)
+        opts = self.model._meta
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        
+        insert_fields = [opts.get_field(name) for name in ('user', 'post', 'comment', 'created_at')]
+        sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING RETURNING {}'.format(
+            qn(opts.db_table),
+            ', '.join(qn(field.column) for field in insert_fields),
+            ', '.join(['%s'] * len(insert_fields)),
+            qn(opts.pk.column),
+        )
+        params = [
+            field.get_db_prep_save(getattr(like, field.attname), connection)
+            for field in insert_fields
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        
+        like.pk = row[0]
+        like._state.adding = False
+        like._state.db = self.db
+        post_save.send(
+            sender=self.model, instance=like, created=True,
+            update_fields=None, raw=False, using=self.db
+        )
+        return like
 
 
 class Like(models.Model):
@@ -102,6 +216,8 @@ class Like(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = LikeManager()
+
     class Meta:
         # Prevent duplicate likes at database level
         constraints = [
@@ -127,19 +243,139 @@ class Like(models.Model):
         indexes = [
             models.Index(fields=['user', 'post']),
             models.Index(fields=['user', 'comment']),
-            models.Index(fields=['created_at']),
+            # expire_karma scans a created_at range and resolves each like's
+            # target; the target id in the index covers that without the
+            # heap. The leading created_at also serves plain range scans.
+            models.Index(fields=['created_at', 'post'], name='like_created_post_idx'),
+            models.Index(fields=['created_at', 'comment'], name='like_created_comment_idx'),
         ]
 
     def __str__(self):
-        target = f"Post {self.post.id}" if self.post else f"Comment {self.comment.id}"
+        target = f"Post {self.post_id}" if self.post_id else f"Comment {self.comment_id}"
         return f"{self.user.username} likes {target}"
 
     def clean(self):
+        # Form-level mirror of like_has_single_target; save() relies on the
+        # CheckConstraint, callers wanting a friendly error use full_clean()
         from django.core.exceptions import ValidationError
-        # Ensure exactly one target is set
-        if (self.post is None) == (self.comment is None):
+        if (self.post_id is None) == (self.comment_id is None):
             raise ValidationError("Like must target exactly one: post or comment")
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+
+class UserKarmaManager(models.Manager):
+    """
+    Incremental maintenance of UserKarma counters.
+    Each method is a single UPDATE in the common case so it can run inside
+    the caller's transaction without extra round-trips.
+    """
+
+    def _like_target(self, like):
+        """Return (filter kwargs for the author's row, counter field, points)"""
+        if like.post_id:
+            return {'user__posts__id': like.post_id}, 'post_karma_24h', POST_LIKE_KARMA
+        return {'user__comments__id': like.comment_id}, 'comment_karma_24h', COMMENT_LIKE_KARMA
+
+    def credit_like(self, like):
+        """Add a new like's karma to its target author's counter"""
+        author_filter, field, points = self._like_target(like)
+        if self.filter(**author_filter).update(**{field: F(field) + points}):
+            return
+
+        # First karma for this author inside the window: create the row
+        if like.post_id:
+            author_id = Post.objects.filter(pk=like.post_id).values_list('author_id', flat=True).first()
+        else:
+            author_id = Comment.objects.filter(pk=like.comment_id).values_list('author_id', flat=True).first()
+        if author_id is None:
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=author_id, **{field: points})
+        except IntegrityError:
+            # Row was created concurrently - fall back to the increment
+            self.filter(user_id=author_id).update(**{field: F(field) + points})
+
+    def debit_like(self, like):
+        """
+        Remove a deleted like's karma from its target author's counter.
+        Likes at or before the KarmaWatermark cutoff were already aged out
+        by `manage.py expire_karma`, so they are skipped.
+        Returns whether a counter changed.
+        """
+        cutoff = KarmaWatermark.objects.shared_cutoff()
+        if cutoff is not None and like.created_at <= cutoff:
+            return False
+        author_filter, field, points = self._like_target(like)
+        return bool(self.filter(**author_filter).update(**{field: F(field) - points}))
+
+
+class UserKarma(models.Model):
+    """
+    Denormalized 24-hour karma per user.
+    Like stays the source of truth; counters are updated on every like
+    insert/delete (see signals.py) and old likes are subtracted again by the
+    `expire_karma` management command, which should run every minute.
+    """
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='karma'
+    )
+    post_karma_24h = models.IntegerField(default=0)
+    comment_karma_24h = models.IntegerField(default=0)
+    karma_24h = models.GeneratedField(
+        expression=F('post_karma_24h') + F('comment_karma_24h'),
+        output_field=models.IntegerField(),
+        db_persist=True
+    )
+
+    objects = UserKarmaManager()
+
+    class Meta:
+        indexes = [
+            # Leaderboard reads only rows with karma, so index just those
+            models.Index(
+                fields=['-karma_24h'],
+                name='karma_leaderboard_idx',
+                condition=models.Q(karma_24h__gt=0)
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.post_karma_24h + self.comment_karma_24h} karma"
+
+
+class KarmaWatermarkManager(models.Manager):
+    def shared_cutoff(self):
+        """
+        Current cutoff, or None before the first expire_karma run.
+        
+        On PostgreSQL the row is read FOR SHARE: unlikes don't block each
+        other, but expire_karma (FOR UPDATE) waits for them and they wait
+        for it, so a like is subtracted by its unlike or by the expiry run,
+        never both.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return self.values_list('cutoff', flat=True).first()
+        
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT cutoff FROM {table} FOR SHARE')
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class KarmaWatermark(models.Model):
+    """
+    Single-row table holding the global karma expiry cutoff.
+    Likes created at or before `cutoff` have been subtracted from UserKarma
+    by `expire_karma`; everything newer is still counted.
+    """
+    cutoff = models.DateTimeField(default=karma_window_start)
+
+    objects = KarmaWatermarkManager()
+
+    def __str__(self):
+        return f"Karma counted after {self.cutoff}"
@@ -0,0 +1,14 @@
+# community/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the post feed.
+    Pages are fetched with an indexed WHERE created_at < cursor instead of
+    OFFSET, and no COUNT(*) over the whole posts table is needed.
+    """
+    page_size = 20
+    cursor_query_param = 'cursor'
+    # id breaks ties between posts created in the same instant
+    ordering = ('-created_at', '-id')
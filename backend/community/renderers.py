@@ -0,0 +1,37 @@
+# community/renderers.py
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson doesn't know natively (lazy translations, Decimal, ...)
+# fall back to DRF's encoder
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Drop-in replacement for JSONRenderer that encodes with orjson,
+    writing UTF-8 bytes in C instead of stdlib json's Python encoder.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_drf_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONParser(BaseParser):
+    """Parses JSON request bodies with orjson."""
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -1,11 +1,12 @@
 # community/serializers.py
 from rest_framework import serializers
+from django.db import models
 from django.db.models import Prefetch, Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from .models import User, Post, Comment, Like
+from .models import User, Post, Comment, Like, UserKarma
 
 
 class UserBasicSerializer(serializers.ModelSerializer):
@@ -16,11 +17,13 @@ class UserBasicSerializer(serializers.ModelSerializer):
 
 
 class UserLeaderboardSerializer(serializers.ModelSerializer):
-    """User serializer with karma for leaderboard"""
+    """User with 24h karma for leaderboard, read from UserKarma"""
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
     karma_24h = serializers.IntegerField(read_only=True)
     
     class Meta:
-        model = User
+        model = UserKarma
         fields = ['id', 'username', 'karma_24h']
 
 
@@ -57,14 +60,15 @@ class LoginSerializer(serializers.Serializer):
         username = attrs.get('username')
         password = attrs.get('password')
 
-        if not User.objects.filter(username=username).exists():
-            raise serializers.ValidationError({"detail": "User does not exist. Please sign up first."})
-
         user = authenticate(username=username, password=password)
         
         if user and user.is_active:
             attrs['user'] = user
             return attrs
+        
+        # Only failed logins pay for the lookup behind the sign-up hint
+        if not User.objects.filter(username=username).exists():
+            raise serializers.ValidationError({"detail": "User does not exist. Please sign up first."})
             
         raise serializers.ValidationError({"detail": "Wrong username or password."})
 
@@ -76,7 +80,6 @@ class CommentSerializer(serializers.ModelSerializer):
     """
     author = UserBasicSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
-    like_count = serializers.SerializerMethodField()
     user_has_liked = serializers.SerializerMethodField()
     
     class Meta:
@@ -87,22 +90,12 @@ class CommentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'like_count']
 
-    def get_like_count(self, obj):
-        """Use annotated value if available, else property"""
-        return getattr(obj, 'annotated_like_count', obj.like_count)
-
     def get_replies(self, obj):
         """
-        Recursively serialize replies using prefetched data.
-        NO additional queries - relies on prefetch_related in view.
+        Recursively serialize replies.
+        Full post trees are built iteratively by PostDetailSerializer instead.
         """
-        # Access prefetched replies without hitting DB
-        if hasattr(obj, '_prefetched_replies'):
-            replies = obj._prefetched_replies
-        else:
-            replies = obj.replies.all()
-        
-        return CommentSerializer(replies, many=True, context=self.context).data
+        return CommentSerializer(obj.replies.all(), many=True, context=self.context).data
 
     def get_user_has_liked(self, obj):
         """Check if current user has liked this comment"""
@@ -110,19 +103,40 @@ class CommentSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         
-        # Use prefetched data if available
-        if hasattr(obj, '_user_likes'):
-            return any(like.comment_id == obj.id for like in obj._user_likes)
+        # Use ids looked up once by the view if available
+        liked_ids = self.context.get('liked_comment_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
         
         return obj.comment_likes.filter(user=request.user).exists()
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    many=True wrapper for PostSerializer that looks up the user's likes for
+    all posts being serialized in one query, whoever the caller is.
+    """
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        posts = list(data)
+        
+        request = self.context.get('request')
+        if request and request.user.is_authenticated and 'liked_post_ids' not in self.context:
+            self.context['liked_post_ids'] = frozenset(
+                Like.objects.filter(
+                    user=request.user, post_id__in=[post.id for post in posts]
+                ).values_list('post_id', flat=True)
+            )
+        
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     """
     Post serializer with efficient comment tree loading.
     """
     author = UserBasicSerializer(read_only=True)
-    like_count = serializers.SerializerMethodField()
     comment_count = serializers.IntegerField(read_only=True)
     user_has_liked = serializers.SerializerMethodField()
     
@@ -133,10 +147,7 @@ class PostSerializer(serializers.ModelSerializer):
             'like_count', 'comment_count', 'user_has_liked'
         ]
         read_only_fields = ['created_at', 'like_count', 'comment_count']
-
-    def get_like_count(self, obj):
-        """Use annotated value if available, else property"""
-        return getattr(obj, 'annotated_like_count', obj.like_count)
+        list_serializer_class = PostListSerializer
 
     def get_user_has_liked(self, obj):
         """Check if current user has liked this post"""
@@ -144,9 +155,10 @@ class PostSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         
-        # Use prefetched data if available
-        if hasattr(obj, '_user_likes'):
-            return any(like.post_id == obj.id for like in obj._user_likes)
+        # Use ids looked up once by PostListSerializer / the view if available
+        liked_ids = self.context.get('liked_post_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
         
         return obj.post_likes.filter(user=request.user).exists()
 
@@ -154,7 +166,7 @@ class PostSerializer(serializers.ModelSerializer):
 class PostDetailSerializer(PostSerializer):
     """
     Post detail with full comment tree.
-    Comments are prefetched in the view to avoid N+1.
+    The tree is fetched and serialized in the view to avoid N+1.
     """
     comments = serializers.SerializerMethodField()
     
@@ -163,12 +175,10 @@ class PostDetailSerializer(PostSerializer):
 
     def get_comments(self, obj):
         """
-        Return only top-level comments.
-        Nested replies are handled recursively in CommentSerializer.
+        Return the comment tree prebuilt as plain dicts by
+        PostViewSet._serialize_comment_tree (top-level comments only).
         """
-        # Filter for top-level comments (parent=None)
-        top_level_comments = [c for c in obj._prefetched_comments if c.parent_id is None]
-        return CommentSerializer(top_level_comments, many=True, context=self.context).data
+        return self.context.get('comment_tree', [])
 
 
 class CreatePostSerializer(serializers.ModelSerializer):
@@ -218,12 +228,5 @@ class LikeSerializer(serializers.Serializer):
                 "Must specify exactly one: post_id or comment_id"
             )
         
-        # Verify target exists
-        if post_id:
-            if not Post.objects.filter(id=post_id).exists():
-                raise serializers.ValidationError("Post does not exist")
-        if comment_id:
-            if not Comment.objects.filter(id=comment_id).exists():
-                raise serializers.ValidationError("Comment does not exist")
-        
+        # Target existence is enforced by the FK constraint in LikeViewSet.toggle
         return data
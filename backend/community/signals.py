@@ -0,0 +1,67 @@
+# community/signals.py
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Post, Comment, Like, UserKarma, LEADERBOARD_CACHE_KEY
+
+
+def _liked_target(like):
+    """Queryset for the single post/comment a like points at"""
+    if like.post_id:
+        return Post.objects.filter(pk=like.post_id)
+    return Comment.objects.filter(pk=like.comment_id)
+
+
+def _still_there(like):
+    """
+    Lock the like's row and report whether it still exists.
+    Cascades and bulk deletes collect rows without locking them, so a
+    concurrent unlike may already have deleted this one and moved its
+    counters; they must only move for rows this transaction deletes.
+    Cached on the instance so the like_count and karma receivers share
+    one locking query.
+    """
+    if not hasattr(like, '_still_there'):
+        like._still_there = Like.objects.select_for_update().filter(pk=like.pk).exists()
+    return like._still_there
+
+
+def _invalidate_leaderboard():
+    """Drop the cached leaderboard once the karma change is committed"""
+    transaction.on_commit(lambda: cache.delete(LEADERBOARD_CACHE_KEY))
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        _liked_target(instance).update(like_count=F('like_count') + 1)
+
+
+@receiver(pre_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    if _still_there(instance):
+        _liked_target(instance).update(like_count=F('like_count') - 1)
+
+
+@receiver(post_save, sender=Like)
+def credit_karma_on_like(sender, instance, created, **kwargs):
+    """Keep UserKarma in sync with new likes (runs in the caller's transaction)"""
+    if created:
+        UserKarma.objects.credit_like(instance)
+        _invalidate_leaderboard()
+
+
+@receiver(pre_delete, sender=Like)
+def debit_karma_on_unlike(sender, instance, **kwargs):
+    """
+    Also fires for likes removed by cascades (post/comment/user deletion).
+    pre_delete so the liked post/comment still exists to resolve its author.
+    """
+    if not _still_there(instance):
+        return
+    # Expired likes no longer count, so the leaderboard is unchanged
+    if UserKarma.objects.debit_like(instance):
+        _invalidate_leaderboard()
@@ -0,0 +1,319 @@
+# community/tests.py
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection, IntegrityError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    User, Post, Comment, Like, LikeManager, UserKarma, UserKarmaManager, KarmaWatermark,
+    KARMA_WINDOW, POST_LIKE_KARMA, karma_window_start
+)
+
+
+def karma(user):
+    """The user's counted 24h karma (0 when they have no UserKarma row)"""
+    return UserKarma.objects.filter(user=user).values_list('karma_24h', flat=True).first() or 0
+
+
+class LikeCountSaveTests(TestCase):
+    """Saving a loaded post/comment must not write its like_count back"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.liker = User.objects.create_user('liker', password='pw')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content='hi')
+
+    def test_stale_post_save_keeps_likes_that_landed_meanwhile(self):
+        post = Post.objects.get(pk=self.post.pk)
+        Like.objects.create_unless_exists(user=self.liker, post_id=self.post.id)
+        post.content = 'edited'
+        post.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content, 'edited')
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_stale_comment_save_keeps_likes_that_landed_meanwhile(self):
+        comment = Comment.objects.get(pk=self.comment.pk)
+        Like.objects.create_unless_exists(user=self.liker, comment_id=self.comment.id)
+        comment.content = 'edited'
+        comment.save()
+
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.content, 'edited')
+        self.assertEqual(self.comment.like_count, 1)
+
+    def test_like_count_is_read_only_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            reverse('post-detail', args=[self.post.id]),
+            {'content': 'edited', 'like_count': 99}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+
+class CommentUpdateTests(TestCase):
+    def test_patch_bumps_updated_at(self):
+        author = User.objects.create_user('author', password='pw')
+        post = Post.objects.create(author=author, content='hello')
+        comment = Comment.objects.create(post=post, author=author, content='hi')
+        Comment.objects.filter(pk=comment.pk).update(updated_at=comment.updated_at - timedelta(hours=1))
+        before = Comment.objects.get(pk=comment.pk).updated_at
+
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.patch(
+            reverse('comment-detail', args=[comment.id]), {'content': 'edited'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(Comment.objects.get(pk=comment.pk).updated_at, before)
+
+
+class KarmaExpiryTests(TestCase):
+    """Unlikes and expire_karma must each subtract a like's karma at most once"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.liker = User.objects.create_user('liker', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        self.post = Post.objects.create(author=self.author, content='hello')
+
+    def toggle(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse('like-toggle'), {'post_id': self.post.id}, format='json')
+
+    def expire_karma(self):
+        call_command('expire_karma', stdout=StringIO())
+
+    def test_unliked_like_is_not_expired_again(self):
+        self.toggle(self.liker)
+        self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+        self.toggle(self.liker)
+        self.assertEqual(karma(self.author), 0)
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + KARMA_WINDOW + timedelta(hours=1)):
+            self.expire_karma()
+
+        self.assertEqual(karma(self.author), 0)
+        self.assertFalse(UserKarma.objects.filter(post_karma_24h__lt=0).exists())
+
+    def test_unlike_of_expired_like_is_not_debited(self):
+        self.toggle(self.liker)
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + KARMA_WINDOW + timedelta(hours=1)):
+            self.toggle(self.other)
+            self.assertEqual(karma(self.author), 2 * POST_LIKE_KARMA)
+
+            # The first like left the window: expire_karma takes it off once
+            self.expire_karma()
+            self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+
+            # Unliking it afterwards must not subtract it a second time
+            self.assertEqual(self.toggle(self.liker).data['status'], 'unliked')
+            self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+
+            self.toggle(self.other)
+            self.assertEqual(karma(self.author), 0)
+
+
+class LikeToggleErrorTests(TransactionTestCase):
+    """FK violations surface at commit, so these need real transactions"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.liker = User.objects.create_user('liker', password='pw')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.liker)
+
+    def toggle(self, post_id):
+        return self.client.post(reverse('like-toggle'), {'post_id': post_id}, format='json')
+
+    def test_missing_post_is_a_bad_request(self):
+        response = self.toggle(self.post.id + 1000)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Post does not exist'})
+        self.assertFalse(Like.objects.exists())
+
+    def test_other_integrity_errors_are_not_reported_as_missing_post(self):
+        self.toggle(self.post.id)
+        # Counter already out of sync: the unlike would violate its CHECK
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+
+        with self.assertRaises(IntegrityError):
+            self.toggle(self.post.id)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locks and concurrent connections')
+class ConcurrentUnlikeTests(TransactionTestCase):
+    """
+    Two toggles from the same user that both find the like already there
+    must remove it once: only one of them may fire the pre_delete counter
+    updates.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.liker = User.objects.create_user('liker', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        # Flushed between tests after the first; the migration creates it
+        KarmaWatermark.objects.update_or_create(pk=1, defaults={'cutoff': karma_window_start()})
+        Like.objects.create_unless_exists(user=self.liker, post_id=self.post.id)
+        Like.objects.create_unless_exists(user=self.other, post_id=self.post.id)
+
+    def toggle(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse('like-toggle'), {'post_id': self.post.id}, format='json')
+
+    def double_unlike(self):
+        """Run two unlike toggles whose ON CONFLICT inserts both hit the existing like"""
+        barrier = threading.Barrier(2, timeout=10)
+        create_unless_exists = LikeManager.create_unless_exists
+
+        def create_then_wait(manager, **fields):
+            like = create_unless_exists(manager, **fields)
+            barrier.wait()
+            return like
+
+        responses = []
+
+        def run():
+            try:
+                responses.append(self.toggle(self.liker))
+            finally:
+                connection.close()
+
+        with mock.patch.object(LikeManager, 'create_unless_exists', create_then_wait):
+            threads = [threading.Thread(target=run) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return responses
+
+    def test_double_unlike_decrements_like_count_once(self):
+        responses = self.double_unlike()
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual([r.data['status'] for r in responses], ['unliked', 'unliked'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, Like.objects.filter(post=self.post).count())
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_double_unlike_debits_karma_once(self):
+        self.assertEqual(karma(self.author), 2 * POST_LIKE_KARMA)
+
+        self.double_unlike()
+
+        self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+
+    def test_unlike_during_expiry_debits_karma_once(self):
+        """expire_karma must wait for an in-flight unlike instead of counting its like too"""
+        # A like that stays inside the window keeps the author's row alive
+        late = Like.objects.create_unless_exists(
+            user=User.objects.create_user('late', password='pw'), post_id=self.post.id
+        )
+        Like.objects.filter(pk=late.pk).update(created_at=late.created_at + timedelta(hours=2))
+
+        debited = threading.Event()
+        debit_like = UserKarmaManager.debit_like
+
+        def debit_then_hold(manager, like):
+            changed = debit_like(manager, like)
+            debited.set()
+            time.sleep(0.5)  # keep the unlike's transaction open
+            return changed
+
+        def run():
+            try:
+                self.toggle(self.liker)
+            finally:
+                connection.close()
+
+        with mock.patch.object(UserKarmaManager, 'debit_like', debit_then_hold):
+            thread = threading.Thread(target=run)
+            thread.start()
+            self.assertTrue(debited.wait(10))
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() + KARMA_WINDOW + timedelta(hours=1)):
+                call_command('expire_karma', stdout=StringIO())
+            thread.join()
+
+        # The unlike took one like's karma, expiry only the other's
+        self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locks and concurrent connections')
+class ConcurrentCascadeDeleteTests(TransactionTestCase):
+    """
+    Cascades collect Like rows without locking them: one already removed by
+    an in-flight unlike must not move the counters a second time.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.liker = User.objects.create_user('liker', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        KarmaWatermark.objects.update_or_create(pk=1, defaults={'cutoff': karma_window_start()})
+        Like.objects.create_unless_exists(user=self.liker, post_id=self.post.id)
+        Like.objects.create_unless_exists(user=self.other, post_id=self.post.id)
+
+    def delete_during_unlike(self, obj):
+        """Delete obj while the liker's unlike has deleted its row but not committed"""
+        deleted = threading.Event()
+        delete = Like.delete
+
+        def delete_then_hold(like, *args, **kwargs):
+            result = delete(like, *args, **kwargs)
+            deleted.set()
+            time.sleep(0.5)  # keep the unlike's transaction open
+            return result
+
+        def run():
+            try:
+                client = APIClient()
+                client.force_authenticate(self.liker)
+                client.post(reverse('like-toggle'), {'post_id': self.post.id}, format='json')
+            finally:
+                connection.close()
+
+        with mock.patch.object(Like, 'delete', delete_then_hold):
+            thread = threading.Thread(target=run)
+            thread.start()
+            self.assertTrue(deleted.wait(10))
+            obj.delete()
+            thread.join()
+
+    def test_deleting_the_liker_during_an_unlike_moves_counters_once(self):
+        self.delete_during_unlike(User.objects.get(pk=self.liker.pk))
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, Like.objects.filter(post=self.post).count())
+        self.assertEqual(self.post.like_count, 1)
+        # Only the other user's like still counts towards the author
+        self.assertEqual(karma(self.author), POST_LIKE_KARMA)
+
+    def test_deleting_the_post_during_an_unlike_succeeds(self):
+        # Without the re-check the second decrement breaks the like_count CHECK
+        self.delete_during_unlike(Post.objects.get(pk=self.post.pk))
+
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Like.objects.exists())
@@ -4,14 +4,19 @@ from rest_framework.decorators import action
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.response import Response
+from rest_framework.fields import DateTimeField
+from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
-from django.db.models import Prefetch, Count, Q, Case, When, IntegerField, Sum, OuterRef, Subquery, Value, F
+from django.db.models import Count, Q, Case, When, Sum, OuterRef, Subquery
 from django.db.models.functions import Coalesce
 from django.db import transaction, IntegrityError
-from django.utils import timezone
-from datetime import timedelta
+from django.core.cache import cache
 
-from .models import User, Post, Comment, Like
+from .models import (
+    Post, Comment, Like, UserKarma,
+    LEADERBOARD_CACHE_KEY, LEADERBOARD_CACHE_TIMEOUT
+)
+from .pagination import FeedCursorPagination
 from .serializers import (
     PostSerializer, PostDetailSerializer, CreatePostSerializer,
     CommentSerializer, CreateCommentSerializer, LikeSerializer,
@@ -21,11 +26,37 @@ from .serializers import (
 from django.contrib.auth import authenticate, login, logout
 
 
+def _is_foreign_key_violation(exc):
+    """
+    Whether an IntegrityError came from a foreign key constraint:
+    SQLSTATE 23503 on PostgreSQL, SQLITE_CONSTRAINT_FOREIGNKEY on SQLite.
+    """
+    cause = exc.__cause__
+    return (
+        getattr(cause, 'sqlstate', None) == '23503' or
+        getattr(cause, 'sqlite_errorname', None) == 'SQLITE_CONSTRAINT_FOREIGNKEY'
+    )
+
+
+def _liked_ids(user, field, **filters):
+    """
+    Frozen set of target ids (post_id or comment_id) the user has liked
+    among the Likes matching filters - one IN query instead of one EXISTS
+    per row, and O(1) membership checks while serializing.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    return frozenset(
+        Like.objects.filter(user=user, **filters).values_list(field, flat=True)
+    )
+
+
 class PostViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Posts with optimized queries to prevent N+1.
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = FeedCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -37,110 +68,92 @@ class PostViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """
         Optimize queryset based on action.
-        - List: prefetch likes, count comments
-        - Detail: prefetch full comment tree
+        - List: count comments
+        - Detail: count comments (tree is fetched in retrieve)
         """
-        user = self.request.user
-        
-        # Base queryset with author
-        queryset = Post.objects.select_related('author')
+        # Base queryset with author, limited to the columns serializers use
+        queryset = Post.objects.select_related('author').only(
+            'id', 'content', 'like_count', 'created_at', 'updated_at',
+            'author__id', 'author__username'
+        )
         
         if self.action == 'list':
-            # For list view: annotate counts, prefetch user's likes
+            # For list view: annotate comment count (like_count is stored;
+            # user's likes are fetched per page by PostListSerializer).
+            # A correlated COUNT subquery avoids joining + GROUP BY over
+            # every comment of every post.
+            comment_counts = Comment.objects.filter(
+                post=OuterRef('pk')
+            ).values('post').annotate(count=Count('id')).values('count')
             queryset = queryset.annotate(
-                annotated_like_count=Count('post_likes', distinct=True),
-                comment_count=Count('comments', distinct=True)
+                comment_count=Coalesce(Subquery(comment_counts), 0)
             )
-            
-            # Prefetch user's likes for "user_has_liked" check
-            if user.is_authenticated:
-                user_likes_prefetch = Prefetch(
-                    'post_likes',
-                    queryset=Like.objects.filter(user=user),
-                    to_attr='_user_likes'
-                )
-                queryset = queryset.prefetch_related(user_likes_prefetch)
         
         elif self.action == 'retrieve':
-            # For detail view: prefetch complete comment tree efficiently
-            queryset = self._prefetch_comment_tree(queryset, user)
+            # For detail view: comment tree is loaded in retrieve().
+            # comments is the only multi-valued join, so no DISTINCT needed
+            queryset = queryset.annotate(
+                comment_count=Count('comments')
+            )
         
         return queryset
     
-    def _prefetch_comment_tree(self, queryset, user):
+    def retrieve(self, request, *args, **kwargs):
         """
-        Prefetch entire comment tree in minimal queries.
+        Override retrieve to load the comment tree in minimal queries.
         
         Strategy:
-        1. Fetch all comments for the post in one query
-        2. Fetch all comment likes for the post's comments
-        3. Build tree in Python (no recursive DB calls)
+        1. Fetch all comments for the post in depth-first order with one
+           recursive CTE (like counts are stored on each comment)
+        2. Fetch the user's post and comment likes in one query each
+        3. Build tree of plain dicts in Python in a single pass
         """
-        # Prefetch all comments with their authors
-        comments_prefetch = Prefetch(
-            'comments',
-            queryset=Comment.objects.select_related('author').annotate(
-                annotated_like_count=Count('comment_likes', distinct=True)
-            ).order_by('created_at'),
-            to_attr='_prefetched_comments'
-        )
-        
-        queryset = queryset.prefetch_related(comments_prefetch)
+        instance = self.get_object()
+        comments = Comment.objects.thread(instance.id)
         
-        # Annotate like count for posts
-        queryset = queryset.annotate(
-            annotated_like_count=Count('post_likes', distinct=True),
-            comment_count=Count('comments', distinct=True)
+        liked_comment_ids = _liked_ids(
+            request.user, 'comment_id',
+            comment_id__in=[comment.id for comment in comments]
         )
         
-        # Prefetch user's likes
-        if user.is_authenticated:
-            user_post_likes = Prefetch(
-                'post_likes',
-                queryset=Like.objects.filter(user=user),
-                to_attr='_user_likes'
-            )
-            queryset = queryset.prefetch_related(user_post_likes)
-        
-        return queryset
-    
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Override retrieve to build comment tree in Python.
-        """
-        instance = self.get_object()
-        
-        # Build comment tree structure
-        self._build_comment_tree(instance)
+        context = self.get_serializer_context()
+        context['liked_post_ids'] = _liked_ids(request.user, 'post_id', post_id=instance.id)
+        context['comment_tree'] = self._serialize_comment_tree(comments, liked_comment_ids)
         
-        serializer = self.get_serializer(instance)
+        serializer = self.get_serializer(instance, context=context)
         return Response(serializer.data)
     
-    def _build_comment_tree(self, post):
+    def _serialize_comment_tree(self, comments, liked_ids):
         """
-        Build nested comment structure from flat list.
-        Attaches replies to parent comments using Python dict lookup.
+        Build the nested comment tree from the flat list.
         
-        This prevents N+1 queries by organizing prefetched data.
+        Comments arrive parents-first (Comment.objects.thread), so one
+        iterative pass with an id -> dict map links every reply; no
+        per-node CommentSerializer. Each node has the same shape as
+        CommentSerializer output. Returns only top-level comments.
         """
-        if not hasattr(post, '_prefetched_comments'):
-            return
+        created_at_field = DateTimeField()
         
-        comments = post._prefetched_comments
-        
-        # Create lookup dict for O(1) access
-        comment_dict = {comment.id: comment for comment in comments}
-        
-        # Attach replies to their parents
+        nodes = {}
+        top_level_comments = []
         for comment in comments:
-            comment._prefetched_replies = []
-            
-            if comment.parent_id:
-                parent = comment_dict.get(comment.parent_id)
-                if parent:
-                    if not hasattr(parent, '_prefetched_replies'):
-                        parent._prefetched_replies = []
-                    parent._prefetched_replies.append(comment)
+            node = nodes[comment.id] = {
+                'id': comment.id,
+                'post': comment.post_id,
+                'author': {'id': comment.author_id, 'username': comment.author.username},
+                'parent': comment.parent_id,
+                'content': comment.content,
+                'created_at': created_at_field.to_representation(comment.created_at),
+                'like_count': comment.like_count,
+                'user_has_liked': comment.id in liked_ids,
+                'replies': [],
+            }
+            if comment.parent_id is None:
+                top_level_comments.append(node)
+            elif comment.parent_id in nodes:
+                nodes[comment.parent_id]['replies'].append(node)
+        
+        return top_level_comments
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -148,18 +161,44 @@ class CommentViewSet(viewsets.ModelViewSet):
     ViewSet for Comments.
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
-    queryset = Comment.objects.select_related('author', 'post')
+    # post/parent are serialized as ids, so only the author is joined
+    queryset = Comment.objects.select_related('author').only(
+        'id', 'content', 'like_count', 'created_at', 'updated_at', 'parent_id', 'post_id',
+        'author__id', 'author__username'
+    )
     
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateCommentSerializer
         return CommentSerializer
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Override list to look up the user's comment likes in one query.
+        Replies are serialized recursively, so cover every comment on the
+        posts in the page rather than just the page itself.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        comments = page if page is not None else list(queryset)
+        
+        context = self.get_serializer_context()
+        context['liked_comment_ids'] = _liked_ids(
+            request.user, 'comment_id',
+            comment__post_id__in={comment.post_id for comment in comments}
+        )
+        
+        serializer = self.get_serializer(comments, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
 
 class LikeViewSet(viewsets.ViewSet):
     """
     ViewSet for Like/Unlike actions.
-    Handles race conditions with atomic transactions and DB constraints.
+    Races are resolved by the DB: duplicate likes hit ON CONFLICT DO NOTHING
+    instead of raising, so no exception path is taken for them.
     """
     permission_classes = [IsAuthenticated]
     
@@ -168,7 +207,8 @@ class LikeViewSet(viewsets.ViewSet):
         """
         Toggle like on a post or comment.
         Uses atomic transaction to prevent race conditions.
-        DB unique constraints prevent duplicate likes.
+        DB constraints prevent duplicate likes and likes on missing targets,
+        so no existence checks are needed up front.
         """
         serializer = LikeSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -177,51 +217,57 @@ class LikeViewSet(viewsets.ViewSet):
         comment_id = serializer.validated_data.get('comment_id')
         user = request.user
         
+        target = {'post_id': post_id} if post_id else {'comment_id': comment_id}
+        
         try:
             with transaction.atomic():
-                # Build filter for this like
-                filter_kwargs = {'user': user}
-                create_kwargs = {'user': user}
-                
-                if post_id:
-                    filter_kwargs['post_id'] = post_id
-                    create_kwargs['post_id'] = post_id
-                else:
-                    filter_kwargs['comment_id'] = comment_id
-                    create_kwargs['comment_id'] = comment_id
+                # Single INSERT ... ON CONFLICT DO NOTHING; None means the
+                # like already existed, so this toggle removes it
+                like = Like.objects.create_unless_exists(user=user, **target)
                 
-                # Try to delete existing like
-                deleted, _ = Like.objects.filter(**filter_kwargs).delete()
-                
-                if deleted:
-                    # Like was removed
+                if like is None:
+                    # Lock the row first: a concurrent unlike then finds
+                    # nothing, so only one transaction fires the pre_delete
+                    # counter updates for it
+                    like = Like.objects.select_for_update().filter(user=user, **target).first()
+                    if like is not None:
+                        like.delete()
                     return Response({
                         'status': 'unliked',
                         'message': 'Like removed successfully'
                     }, status=status.HTTP_200_OK)
-                else:
-                    # Create new like
-                    Like.objects.create(**create_kwargs)
-                    return Response({
-                        'status': 'liked',
-                        'message': 'Like added successfully'
-                    }, status=status.HTTP_201_CREATED)
-        
-        except IntegrityError as e:
-            # Race condition: like was created between check and create
-            # This is caught by unique constraint
+                
+                return Response({
+                    'status': 'liked',
+                    'message': 'Like added successfully'
+                }, status=status.HTTP_201_CREATED)
+        
+        except IntegrityError as exc:
+            # The FK constraint (checked at commit) means the target
+            # post/comment is missing; anything else, e.g. the like_count
+            # CHECK, is a real error
+            if not _is_foreign_key_violation(exc):
+                raise
             return Response({
-                'error': 'Concurrent modification detected. Please try again.'
-            }, status=status.HTTP_409_CONFLICT)
+                'error': 'Post does not exist' if post_id else 'Comment does not exist'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
 
 class LeaderboardViewSet(viewsets.ViewSet):
     """
     ViewSet for leaderboard showing top users by 24-hour karma.
-    Karma is calculated dynamically from Like records.
+    Karma is read from the denormalized UserKarma table.
     """
     permission_classes = [AllowAny]
     
+    def perform_authentication(self, request):
+        """
+        Skip DRF's eager authentication: the response is the same for
+        everyone, so a logged-in caller's session/user lookups are never
+        paid (request.user still resolves lazily if accessed).
+        """
+        pass
+    
     @action(detail=False, methods=['get'])
     def top(self, request):
         """
@@ -231,51 +277,32 @@ class LeaderboardViewSet(viewsets.ViewSet):
         - Post Like → +5 Karma
         - Comment Like → +1 Karma
         
-        Only likes created in the last 24 hours count.
-        """
-        # Calculate 24 hours ago
-        time_threshold = timezone.now() - timedelta(hours=24)
+        Only likes created in the last 24 hours count
+        (older likes are aged out by `manage.py expire_karma`).
         
-        # Subquery for Post Karma (Likes on user's posts)
-        post_karma_sq = Subquery(
-            Like.objects.filter(
-                post__author=OuterRef('pk'),
-                created_at__gte=time_threshold
-            ).values('post__author').annotate(
-                total=Count('id') * 5
-            ).values('total')[:1],
-            output_field=IntegerField()
-        )
-
-        # Subquery for Comment Karma (Likes on user's comments)
-        comment_karma_sq = Subquery(
-            Like.objects.filter(
-                comment__author=OuterRef('pk'),
-                created_at__gte=time_threshold
-            ).values('comment__author').annotate(
-                total=Count('id') * 1
-            ).values('total')[:1],
-            output_field=IntegerField()
+        The serialized result is cached for a short TTL; like/unlike and
+        expire_karma clear it, so reads between karma changes skip the DB.
+        """
+        data = cache.get_or_set(
+            LEADERBOARD_CACHE_KEY, self._top_users, LEADERBOARD_CACHE_TIMEOUT
         )
-
-        # Aggregate karma using subqueries
-        leaderboard = User.objects.annotate(
-            pk_karma=Coalesce(post_karma_sq, Value(0)),
-            ck_karma=Coalesce(comment_karma_sq, Value(0))
-        ).annotate(
-            karma_24h=F('pk_karma') + F('ck_karma')
-        ).filter(
+        return Response(data)
+    
+    def _top_users(self):
+        # Counters are maintained on like/unlike, so this is a single
+        # indexed ORDER BY ... LIMIT 5 instead of aggregating Like rows.
+        leaderboard = UserKarma.objects.select_related('user').filter(
             karma_24h__gt=0  # Only users with karma > 0
         ).order_by('-karma_24h')[:5]  # Top 5
         
-        serializer = UserLeaderboardSerializer(leaderboard, many=True)
-        return Response(serializer.data)
+        return UserLeaderboardSerializer(leaderboard, many=True).data
 
 
 class AuthViewSet(viewsets.ViewSet):
     """
     ViewSet for handling Authentication.
-    Uses Django's session-based authentication.
+    Uses Django's session-based authentication; login/register also return
+    a DRF token for clients sending `Authorization: Token <key>`.
     """
     permission_classes = [AllowAny]
     # Standard authentication for 'me' and 'logout'
@@ -304,7 +331,8 @@ class AuthViewSet(viewsets.ViewSet):
         return Response({
             'user': UserBasicSerializer(user).data,
             'message': 'Logged in successfully',
-            'csrftoken': csrf_token
+            'csrftoken': csrf_token,
+            'token': Token.objects.get_or_create(user=user)[0].key
         })
 
     @action(detail=False, methods=['post'])
@@ -332,11 +360,15 @@ class AuthViewSet(viewsets.ViewSet):
         return Response({
             'user': UserBasicSerializer(user).data,
             'message': 'Registration successful',
-            'csrftoken': csrf_token
+            'csrftoken': csrf_token,
+            'token': Token.objects.create(user=user).key
         }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     def logout(self, request):
+        # Revoke the API token along with the session
+        if request.user.is_authenticated:
+            Token.objects.filter(user=request.user).delete()
         logout(request)
         return Response({'message': 'Logged out successfully'})
 
@@ -1,15 +1,24 @@
-import os
+import re
 from pathlib import Path
-from decouple import config, Csv
+from decouple import Config, RepositoryEnv, RepositoryEmpty, Csv
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Env lookups: backend/.env (parsed once, here) with os.environ taking
+# precedence, or just os.environ when there is no .env file
+ENV_FILE = BASE_DIR / '.env'
+config = Config(RepositoryEnv(ENV_FILE) if ENV_FILE.exists() else RepositoryEmpty())
+
 # Security
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-dev-key-change-in-production')
 DEBUG = config('DEBUG', default=True, cast=bool)
 # Allow all hosts in production (Render handles routing, but strict specific domains is better security-wise later)
-ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=Csv())
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=Csv(post_process=tuple))
+
+# Django admin at /admin/. Set ADMIN_ENABLED=False on API-only deploys to
+# drop the admin app, its URLs and the messages framework it depends on.
+ADMIN_ENABLED = config('ADMIN_ENABLED', default=True, cast=bool)
 
 # Application definition
 INSTALLED_APPS = [
@@ -22,22 +31,27 @@ INSTALLED_APPS = [
     
     # Third party
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     
     # Local
     'community',
 ]
 
+# Kept minimal: everything below is required by DRF's SessionAuthentication
+# (sessions, auth), the Django admin (messages) or HTML pages (X-Frame-Options).
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware', # MOVED TO TOP
+    'corsheaders.middleware.CorsMiddleware', # First, so preflights return before any other layer
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware", # Production static files
+    # ETag from the response body; unchanged GETs (e.g. feed polling) get a 304
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware', # Admin only
+    'django.middleware.clickjacking.XFrameOptionsMiddleware', # Admin / browsable API pages
 ]
 
 ROOT_URLCONF = 'playto_backend.urls'
@@ -46,10 +60,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Only admin / browsable API templates, all from installed apps.
+            # Compiled templates are memoized per process (the runserver
+            # autoreloader resets the cache when DEBUG is on).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
-                'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
@@ -58,16 +78,82 @@ TEMPLATES = [
     },
 ]
 
+if not ADMIN_ENABLED:
+    # Nothing but the admin uses messages
+    INSTALLED_APPS.remove('django.contrib.admin')
+    INSTALLED_APPS.remove('django.contrib.messages')
+    MIDDLEWARE.remove('django.contrib.messages.middleware.MessageMiddleware')
+    TEMPLATES[0]['OPTIONS']['context_processors'].remove(
+        'django.contrib.messages.context_processors.messages'
+    )
+
 WSGI_APPLICATION = 'playto_backend.wsgi.application'
+# ASGI servers take playto_backend.asgi:application directly. The DRF views
+# are sync, and under ASGI Django runs sync views one at a time on a shared
+# thread, so deploys stay on gunicorn's WSGI workers until the hot views are async.
 
 # Database
-# Use dj_database_url to parse DATABASE_URL env var, fallback to local posgres
-DATABASES = {
-    'default': dj_database_url.config(
-        default=f"postgres://{config('DB_USER', default='postgres')}:{config('DB_PASSWORD', default='postgres')}@{config('DB_HOST', default='localhost')}:{config('DB_PORT', default='5432')}/{config('DB_NAME', default='playto_community')}",
-        conn_max_age=600
-    )
-}
+# Parse DATABASE_URL if set, otherwise fall back to local postgres built
+# from the DB_* vars (only read when needed). Persistent connections are
+# health-checked before reuse so a dropped socket doesn't fail a request.
+DATABASE_URL = config('DATABASE_URL', default=None)
+if DATABASE_URL:
+    DATABASES = {
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=600,
+            conn_health_checks=True
+        )
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='playto_community'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default='postgres'),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Postgres runs on psycopg 3 (see requirements.txt).
+# Behind PgBouncer in transaction pooling mode, set DB_PGBOUNCER=True:
+# named (server-side) cursors can't outlive a transaction there, and
+# PgBouncer rejects unknown startup parameters. Prepared statements need no
+# setting: Django already defaults psycopg's prepare_threshold to None.
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    db_options = DATABASES['default'].setdefault('OPTIONS', {})
+    # Bind parameters server-side (sent separately, in binary where possible)
+    # instead of interpolating them into the SQL text on the client
+    db_options['server_side_binding'] = True
+    if DB_PGBOUNCER:
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    else:
+        # Start sessions in UTC so Django skips SET TIME ZONE on every new connection
+        db_options['options'] = '-c timezone=UTC'
+
+# Cache
+# Shared Redis cache when REDIS_URL is set (hiredis is picked up
+# automatically for parsing); otherwise Django's per-process local memory.
+REDIS_URL = config('REDIS_URL', default=None)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'max_connections': 50,
+            },
+        }
+    }
+    # Session reads hit Redis; the DB is only written when a session changes.
+    # Needs the shared cache: with local memory, other workers would keep
+    # serving a session after logout.
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 # Custom User Model - CRITICAL: Must match migration history
 AUTH_USER_MODEL = 'community.User'
@@ -84,14 +170,34 @@ USE_TZ = True
 # Static files
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# STATICFILES_STORAGE is ignored since Django 5.1; storage is set via STORAGES.
+# With brotli installed, collectstatic writes .br next to .gz for every file.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+# Only serve the content-hashed copies (cached forever by Whitenoise)
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+# Build the static file index once at startup from STATIC_ROOT; only dev
+# re-scans the finders on each request (these default to DEBUG, pinned here)
+WHITENOISE_AUTOREFRESH = DEBUG
+WHITENOISE_USE_FINDERS = DEBUG
+# Fail at render time on a static file missing from the manifest
+WHITENOISE_MANIFEST_STRICT = True
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework
 REST_FRAMEWORK = {
+    # Token first: one indexed token+user lookup and no session read.
+    # Session auth stays for the browser frontend and the admin.
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -99,6 +205,16 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # orjson for JSON in both directions; same media type as DRF's defaults
+    'DEFAULT_RENDERER_CLASSES': [
+        'community.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'community.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # CORS Settings
@@ -106,29 +222,43 @@ CORS_ALLOW_ALL_ORIGINS = False # Reverting to strict mode
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
     default='http://localhost:3000,http://127.0.0.1:3000',
-    cast=Csv()
+    cast=Csv(post_process=tuple)
+)
+# Optional comma-separated patterns for dynamic origins (e.g. preview
+# deployments), compiled once here rather than on every request.
+# Split by hand: Csv() would strip the backslashes out of the regexes.
+CORS_ALLOWED_ORIGIN_REGEXES = tuple(
+    re.compile(pattern.strip())
+    for pattern in config('CORS_ALLOWED_ORIGIN_REGEXES', default='').split(',')
+    if pattern.strip()
 )
+# Let browsers reuse preflight responses for a day
+CORS_PREFLIGHT_MAX_AGE = 86400
 
 # CSRF Trusted Origins
-CSRF_TRUSTED_ORIGINS = [
+# Matched exactly against the Origin header (scheme://host[:port], never a
+# trailing slash). CORS origins are trusted too; dict.fromkeys drops repeats.
+# Host/origin settings are tuples throughout: fixed after import.
+CSRF_TRUSTED_ORIGINS = tuple(dict.fromkeys([
     'http://localhost:3000',
     'http://127.0.0.1:3000',
     'http://localhost:8000',
     'http://127.0.0.1:8000',
     'https://playtofeed.vercel.app', # Hardcoded Vercel Origin
-    'https://playtofeed.vercel.app/',
-]
-
-# Add CORS origins to CSRF trusted origins
-CSRF_TRUSTED_ORIGINS.extend(config('CORS_ALLOWED_ORIGINS', default='', cast=Csv()))
+    *CORS_ALLOWED_ORIGINS,
+]))
 
 CORS_ALLOW_CREDENTIALS = True
 
-# Security settings for production
 # Security settings for production
 if not DEBUG:
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https') # CRITICAL for Render
-    SECURE_SSL_REDIRECT = True
+    SECURE_SSL_REDIRECT = True # Only ever fires for a browser's first plain-HTTP visit
+    
+    # HSTS: browsers go straight to HTTPS instead of hitting the redirect
+    SECURE_HSTS_SECONDS = config('SECURE_HSTS_SECONDS', default=31536000, cast=int)
+    SECURE_HSTS_INCLUDE_SUBDOMAINS = True
+    SECURE_HSTS_PRELOAD = True
     
     # Cross-Site Cookie Settings
     SESSION_COOKIE_SECURE = True